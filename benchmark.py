@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Speantag Bakery Expense Tracking System
+Synthetic data and benchmarks
+
+    python benchmark.py generate --rows 1M --reset
+    python benchmark.py run --output before.json
+    python benchmark.py compare before.json after.json
+
+Everything runs against BENCHMARK_DATABASE_URL (instance/benchmark.db by default), never the bakery's own database.
+"""
+
+import os
+import sys
+import fnmatch
+import platform
+import subprocess
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from collections import namedtuple
+from time import perf_counter
+import json
+
+import click
+import numpy as np
+
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:///benchmark.db')
+
+from app import (app, db, DailySale, MarketPurchase, PurchaseItem, InventoryItem, InventoryUsage, User, UserActivity,
+                 FraudAlert, UserSession, ExportJob, Money, MONEY_PLACES, UNIT_PRICE_PLACES, init_database,
+                 insert_returning_ids, rebuild_inventory, rebuild_daily_summaries, rebuild_user_sessions, report_cache,
+                 activity_logger, fraud_rules)
+
+BENCHMARK_EMAIL = 'bench@example.com'
+BENCHMARK_PASSWORD = 'benchmark'
+MEASURED_MODELS = (DailySale, MarketPurchase, PurchaseItem, InventoryItem, InventoryUsage, UserActivity, FraudAlert)
+
+# Synthetic data: every table is filled from one seeded generator, so the same --rows and --seed always give the
+# same database. Rows are spread over --days days ending today, busier on Fridays and Saturdays and growing over time.
+ROW_MIX = {  # Share of --rows in each table; inventory items and users are sized from the catalogue
+    DailySale: 0.40,
+    UserActivity: 0.25,
+    PurchaseItem: 0.16,
+    InventoryUsage: 0.12,
+    MarketPurchase: 0.04,
+    FraudAlert: 0.01,
+}
+WEEKDAY_WEIGHTS = np.array([0.9, 0.9, 1.0, 1.0, 1.3, 1.5, 0.7])  # Monday first
+INSERT_CHUNK_SIZE = 20000
+PRODUCTS = ['Bread', 'Sugar Bread', 'Tea Bread', 'Meat Pie', 'Sausage Roll', 'Doughnut', 'Rock Bun', 'Cake',
+            'Cookies', 'Chips', 'Spring Roll', 'Pizza']
+RESALE_ITEMS = ['Water', 'Soft Drink', 'Malt', 'Yoghurt']  # Bought at the market and sold as they are
+INGREDIENTS = ['Flour', 'Sugar', 'Margarine', 'Butter', 'Eggs', 'Yeast', 'Salt', 'Milk', 'Baking Powder',
+               'Vegetable Oil', 'Nutmeg', 'Vanilla', 'Minced Meat', 'Onions', 'Sausages', 'Cocoa']
+ACTIVITY_MIX = {
+    'Recorded Sale': 0.45,
+    'Recorded Inventory Usage': 0.15,
+    'Login': 0.12,
+    'Logout': 0.10,
+    'Recorded Market Purchase': 0.08,
+    'Activities Saved': 0.05,
+    'Failed Login': 0.03,
+    'Deleted Sale': 0.02,
+}
+
+def parse_scale(ctx, param, value):
+    """Row count given as 10000, 250k or 10M"""
+    text = str(value).strip().lower().replace('_', '')
+    factor = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1:], 1)
+    try:
+        rows = int(float(text[:-1] if factor > 1 else text) * factor)
+    except ValueError:
+        raise click.BadParameter(f'{value!r} is not a row count')
+    if rows < 1000:
+        raise click.BadParameter('use at least 1k rows')
+    return rows
+
+def catalogue(names, size):
+    """size item names: the given ones first, then numbered variants of them"""
+    return [names[i % len(names)] + (f' {i // len(names) + 1}' if i >= len(names) else '') for i in range(size)]
+
+def popularity(size, skew=1.1):
+    """Zipf-like selection probabilities, highest first: a few items account for most rows"""
+    weights = 1 / np.arange(1, size + 1) ** skew
+    return weights / weights.sum()
+
+def stored_table(model):
+    """The model's table with its money columns untyped, so amounts are inserted as stored integer minor units"""
+    return db.table(model.__tablename__, *(
+        db.column(column.name, db.BigInteger if isinstance(column.type, Money) else column.type)
+        for column in model.__table__.columns if column.name != 'id'
+    ))
+
+def insert_chunks(model, count, make_rows):
+    """Insert make_rows(start, stop) for every chunk of count rows, one transaction per chunk"""
+    table = stored_table(model)
+    for start in range(0, count, INSERT_CHUNK_SIZE):
+        db.session.execute(db.insert(table), make_rows(start, min(start + INSERT_CHUNK_SIZE, count)))
+        db.session.commit()
+
+def amount(minor_units, places=MONEY_PLACES):
+    return Decimal(int(minor_units)).scaleb(-places)
+
+class SyntheticData:
+    """Seeded generator of a bakery's sales, purchases, stock, usage, activity and alerts"""
+
+    def __init__(self, rows, seed, days):
+        self.rng = np.random.default_rng(seed)
+        self.counts = {model: max(int(rows * share), 1) for model, share in ROW_MIX.items()}
+        self.days = days
+        self.end = date.today()
+        self.start = self.end - timedelta(days=days - 1)
+        self.dates = [self.start + timedelta(days=offset) for offset in range(days)]
+        weights = WEEKDAY_WEIGHTS[[day.weekday() for day in self.dates]] * (1 + 0.5 * np.arange(days) / days)
+        self.day_weights = weights / weights.sum()
+
+        self.products = catalogue(PRODUCTS, min(max(rows // 20000, len(PRODUCTS)), 500)) + RESALE_ITEMS
+        self.ingredients = catalogue(INGREDIENTS, min(max(rows // 5000, len(INGREDIENTS)), 2000)) + RESALE_ITEMS
+        self.product_prices = self.rng.integers(2, 60, len(self.products)) * 50  # Cents
+        self.ingredient_prices = self.rng.integers(50, 5000, len(self.ingredients)) * 100  # 10**-4 units
+        # Resale items sell for about 30% over their market price, rounded to 10 pesewas
+        self.product_prices[-len(RESALE_ITEMS):] = self.ingredient_prices[-len(RESALE_ITEMS):] * 13 // 10000 * 10
+        self.user_count = min(max(rows // 50000, 3), 200)
+        self.user_ids = []
+
+    def day_offsets(self, size):
+        """Sorted day offsets for size rows, following the weekday pattern and growth"""
+        return np.sort(self.rng.choice(self.days, size, p=self.day_weights)).astype(np.int32)
+
+    def times(self, offsets):
+        """Timestamps inside opening hours (6 AM to 9 PM) on the given days"""
+        seconds = self.rng.integers(6 * 3600, 21 * 3600, len(offsets))
+        return [datetime.combine(self.dates[offset], time()) + timedelta(seconds=int(second))
+                for offset, second in zip(offsets, seconds)]
+
+    def generate(self, echo):
+        for step in (self.users, self.purchases, self.usage, self.sales, self.activities, self.alerts):
+            started = perf_counter()
+            label = step()
+            echo(f'{label} in {perf_counter() - started:.1f}s')
+        started = perf_counter()
+        days = rebuild_daily_summaries()
+        echo(f'Rebuilt rollups for {days} days in {perf_counter() - started:.1f}s')
+
+    def users(self):
+        benchmark_user = User(name='Bench User', email=BENCHMARK_EMAIL, phone='0200000000', is_admin=True)
+        benchmark_user.set_password(BENCHMARK_PASSWORD)
+        users = [benchmark_user] + [
+            User(name=f'Staff {number}', email=f'staff{number}@example.com', phone=f'02{number:08d}',
+                 password_hash=benchmark_user.password_hash)
+            for number in range(1, self.user_count)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        self.user_ids = [user.id for user in users]
+        return f'{len(users)} users'
+
+    def purchases(self):
+        count = self.counts[MarketPurchase]
+        line_count = max(self.counts[PurchaseItem], count)
+        offsets = self.day_offsets(count)
+        # Every purchase gets one line, the rest are spread over random purchases
+        line_purchase = np.sort(np.concatenate([np.arange(count), self.rng.integers(0, count, line_count - count)]))
+        line_ingredient = self.rng.choice(len(self.ingredients), line_count, p=popularity(len(self.ingredients)))
+        quantities = self.rng.integers(1, 51, line_count).astype(float)
+        inflation = 1 + 0.1 * offsets[line_purchase] / self.days
+        unit_prices = np.round(self.ingredient_prices[line_ingredient] * self.rng.uniform(0.9, 1.15, line_count) * inflation)
+        totals = np.round(quantities * unit_prices / 10 ** (UNIT_PRICE_PLACES - MONEY_PLACES)).astype(np.int64)
+        spent = np.zeros(count, dtype=np.int64)
+        np.add.at(spent, line_purchase, totals)
+        taken = (spent * 11 // 10 // 1000 + 1) * 1000  # The spend plus about 10%, rounded up to 10 cedis
+        first_line = np.searchsorted(line_purchase, np.arange(count + 1))
+
+        items_table = stored_table(PurchaseItem)
+        chunk = max(INSERT_CHUNK_SIZE // 5, 1)
+        for start in range(0, count, chunk):
+            stop = min(start + chunk, count)
+            ids = insert_returning_ids(MarketPurchase, [
+                {'purchase_date': self.dates[offsets[i]], 'total_amount_taken': amount(taken[i]),
+                 'total_amount_spent': amount(spent[i]), 'remaining_balance': amount(taken[i] - spent[i])}
+                for i in range(start, stop)
+            ])
+            lines = range(first_line[start], first_line[stop])
+            db.session.execute(db.insert(items_table), [
+                {'market_purchase_id': ids[line_purchase[line] - start], 'item_name': self.ingredients[line_ingredient[line]],
+                 'quantity_purchased': float(quantities[line]), 'unit_price': int(unit_prices[line]), 'total_price': int(totals[line])}
+                for line in lines
+            ])
+            db.session.commit()
+
+        self.purchased = np.bincount(line_ingredient, weights=quantities, minlength=len(self.ingredients))
+        rebuild_inventory({self.ingredients[i] for i in np.unique(line_ingredient)})
+        return f'{count} market purchases with {line_count} items'
+
+    def usage(self):
+        count = self.counts[InventoryUsage]
+        items = {item.item_name: item for item in InventoryItem.query}
+        stocked = np.array([name in items for name in self.ingredients])
+        weights = popularity(len(self.ingredients)) * stocked
+        usage_ingredient = self.rng.choice(len(self.ingredients), count, p=weights / weights.sum())
+        # Scale each item's usage to most of what was bought; a few items are left close to running out
+        raw = self.rng.gamma(2.0, 2.0, count)
+        used = np.bincount(usage_ingredient, weights=raw, minlength=len(self.ingredients))
+        share = 1 - np.clip(self.rng.exponential(0.03, len(self.ingredients)), 0, 0.5)
+        scale = np.divide(self.purchased * share, used, out=np.zeros_like(used), where=used > 0)
+        quantities = np.round(raw * scale[usage_ingredient], 3)
+        item_ids = np.array([items[name].id if name in items else 0 for name in self.ingredients])
+        unit_costs = np.array([int(items[name].cost_per_unit.scaleb(UNIT_PRICE_PLACES)) if name in items else 0
+                               for name in self.ingredients])
+        costs = np.round(quantities * unit_costs[usage_ingredient] / 10 ** (UNIT_PRICE_PLACES - MONEY_PLACES)).astype(np.int64)
+        profits = (costs * 3 + 5) // 10  # 30% of the cost used, as the usage form assumes
+        offsets = self.day_offsets(count)
+
+        def rows(start, stop):
+            created = self.times(offsets[start:stop])
+            return [
+                {'inventory_item_id': int(item_ids[usage_ingredient[i]]), 'quantity_used': float(quantities[i]),
+                 'cost_used': int(costs[i]), 'expected_profit': int(profits[i]), 'usage_date': self.dates[offsets[i]],
+                 'created_at': created[i - start]}
+                for i in range(start, stop)
+            ]
+        insert_chunks(InventoryUsage, count, rows)
+        rebuild_inventory(items.keys())
+        return f'{len(items)} inventory items, {count} usages'
+
+    def sales(self):
+        count = self.counts[DailySale]
+        offsets = self.day_offsets(count)
+        products = self.rng.choice(len(self.products), count, p=popularity(len(self.products)))
+        quantities = self.rng.integers(1, 30, count)
+        unit_factor = 10 ** (UNIT_PRICE_PLACES - MONEY_PLACES)
+
+        def rows(start, stop):
+            created = self.times(offsets[start:stop])
+            return [
+                {'item_name': self.products[products[i]], 'quantity_sold': float(quantities[i]),
+                 'unit_price': int(self.product_prices[products[i]]) * unit_factor,
+                 'total_amount': int(quantities[i] * self.product_prices[products[i]]),
+                 'sale_date': self.dates[offsets[i]], 'created_at': created[i - start]}
+                for i in range(start, stop)
+            ]
+        insert_chunks(DailySale, count, rows)
+        return f'{count} sales'
+
+    def activities(self):
+        count = self.counts[UserActivity]
+        offsets = self.day_offsets(count)
+        users = self.rng.choice(len(self.user_ids), count, p=popularity(len(self.user_ids), skew=0.8))
+        actions = list(ACTIVITY_MIX)
+        action_index = self.rng.choice(len(actions), count, p=np.array(list(ACTIVITY_MIX.values())))
+
+        def rows(start, stop):
+            timestamps = self.times(offsets[start:stop])
+            return [
+                {'user_id': self.user_ids[users[i]], 'action': actions[action_index[i]],
+                 'details': f'{actions[action_index[i]]} (synthetic)', 'timestamp': timestamps[i - start],
+                 'ip_address': f'10.0.{users[i] // 256}.{users[i] % 256}', 'user_agent': 'Mozilla/5.0 (benchmark)',
+                 'session_id': f'bench-{users[i]}-{offsets[i]}',  # One session per user and day
+                 'risk_level': 'medium' if actions[action_index[i]] == 'Failed Login' else 'low'}
+                for i in range(start, stop)
+            ]
+        insert_chunks(UserActivity, count, rows)
+        rebuild_user_sessions()
+        return f'{count} activities, {UserSession.query.count()} sessions'
+
+    def alerts(self):
+        count = self.counts[FraudAlert]
+        rules = app.config['FRAUD_RULES']
+        offsets = self.day_offsets(count)
+        rule_index = self.rng.integers(0, len(rules), count)
+        users = self.rng.integers(0, len(self.user_ids), count)
+        occurrences = self.rng.geometric(0.5, count)
+        resolved = (offsets < self.days - 7) & (self.rng.random(count) < 0.9)  # Older alerts are mostly dealt with
+
+        def rows(start, stop):
+            timestamps = self.times(offsets[start:stop])
+            return [
+                {'user_id': self.user_ids[users[i]], 'alert_type': rules[rule_index[i]]['name'],
+                 'severity': rules[rule_index[i]]['severity'],
+                 'description': f"{rules[rule_index[i]]['name'].replace('_', ' ').capitalize()} (synthetic)",
+                 'ip_address': f'10.0.{users[i] // 256}.{users[i] % 256}', 'user_agent': 'Mozilla/5.0 (benchmark)',
+                 'timestamp': timestamps[i - start], 'occurrence_count': int(occurrences[i]),
+                 'last_seen': timestamps[i - start] + timedelta(minutes=5 * int(occurrences[i] - 1)),
+                 'resolved': bool(resolved[i]),
+                 'resolved_at': timestamps[i - start] + timedelta(hours=2) if resolved[i] else None,
+                 'resolved_by': 'priscilla' if resolved[i] else None}
+                for i in range(start, stop)
+            ]
+        insert_chunks(FraudAlert, count, rows)
+        return f'{count} fraud alerts'
+
+def row_counts():
+    return {model.__tablename__: db.session.scalar(db.select(db.func.count()).select_from(model)) for model in MEASURED_MODELS}
+
+# Benchmarks: every case is requested through the Flask test client, once to warm up and then --repeat times.
+# Report caches and earlier export jobs are cleared before each request unless --warm is given, so the numbers
+# are what a first visitor waits for. Peak memory is taken from one extra request traced with tracemalloc.
+# Records added by the run (sales, activity, alerts) are deleted at the end, the open alerts it counted repeats into
+# are put back as they were and the sessions its activity was counted in are rebuilt, so every run sees the generated
+# data. Latency changes smaller than the noise of the runs themselves
+# are not reported as regressions.
+Case = namedtuple('Case', 'name method path params body admin status')
+ADDED_BY_CASES = (DailySale, FraudAlert, UserActivity)  # Written by logins, sales and fraud checks
+
+def benchmark_cases(last_day):
+    """The requests measured, with date ranges ending on the last day that has data"""
+    month = {'start_date': (last_day - timedelta(days=29)).isoformat(), 'end_date': last_day.isoformat()}
+    year = {'start_date': (last_day - timedelta(days=364)).isoformat(), 'end_date': last_day.isoformat()}
+    sale = {'item_name': 'Bread', 'quantity_sold': '2', 'unit_price': '5.50', 'sale_date': last_day.isoformat()}
+    batch = [dict(sale, quantity_sold=index % 7 + 1) for index in range(100)]
+    return [
+        Case('daily_sales', 'GET', '/daily-sales', None, None, False, 200),
+        Case('record_sale', 'POST', '/daily-sales', None, sale, False, 302),
+        Case('sales_batch', 'POST', '/api/sales/batch', None, batch, False, 201),
+        Case('market_purchase', 'GET', '/market-purchase', None, None, False, 200),
+        Case('inventory_usage', 'GET', '/inventory-usage', None, None, False, 200),
+        Case('reports_month', 'GET', '/reports', month, None, False, 200),
+        Case('reports_year', 'GET', '/reports', year, None, False, 200),
+        Case('analytics_year', 'GET', '/analytics', year, None, False, 200),
+        Case('api_analytics_year', 'GET', '/api/analytics', year, None, False, 200),
+        Case('api_sales_month', 'GET', '/api/sales', month, None, False, 200),
+        Case('api_usage_month', 'GET', '/api/usage', month, None, False, 200),
+        Case('export_csv_month', 'GET', '/export-csv', month, None, False, 200),
+        Case('export_ndjson_month', 'GET', '/export-ndjson', month, None, False, 200),
+        Case('export_excel_month', 'GET', '/export-excel', month, None, False, 302),
+        Case('export_pdf_month', 'GET', '/export-pdf', month, None, False, 302),
+        Case('admin_dashboard', 'GET', '/admin-dashboard', None, None, True, 200),
+        Case('api_alerts', 'GET', '/api/alerts', None, None, True, 200),
+    ]
+
+class QueryCounter:
+    """Counts statements run on the calling thread (the activity logger writes from its own thread)"""
+
+    def __init__(self):
+        self.count = 0
+        self.thread = threading.get_ident()
+
+    def __call__(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+def reset_caches():
+    report_cache.clear()
+    for job in ExportJob.query.all():
+        if job.file_path and os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    db.session.execute(db.delete(ExportJob))
+    db.session.commit()
+
+def last_ids():
+    return {model: db.session.scalar(db.select(db.func.max(model.id))) or 0 for model in ADDED_BY_CASES}
+
+ALERT_REPEAT_COLUMNS = ('occurrence_count', 'last_seen', 'description', 'ip_address', 'user_agent')
+
+def coalescible_alerts():
+    """The columns a repeat rewrites, for the open alerts a fraud check during the run could count a repeat into"""
+    suppress_for = max(rule.suppress_for for rule in fraud_rules.current())
+    rows = db.session.execute(
+        db.select(FraudAlert.id, *(getattr(FraudAlert, column) for column in ALERT_REPEAT_COLUMNS))
+        .where(FraudAlert.resolved == False, FraudAlert.last_seen >= datetime.utcnow() - suppress_for)
+    )
+    return [row._asdict() for row in rows]
+
+def remove_added_rows(before, alerts):
+    """Delete the records the write cases added and recompute the rollups, so the next run sees the same data"""
+    # Repeats of an open alert are counted into it rather than added, so those alerts get their old values back
+    if alerts:
+        db.session.execute(db.update(FraudAlert), alerts)
+        db.session.commit()
+    # The run's activity is folded into sessions, new ones and possibly generated ones, which are rebuilt without it
+    sessions = set(db.session.scalars(
+        db.select(UserActivity.session_id).distinct()
+        .where(UserActivity.id > before[UserActivity], UserActivity.session_id.isnot(None))
+    ))
+    for model, last_id in before.items():
+        db.session.execute(db.delete(model).where(model.id > last_id))
+    db.session.execute(db.delete(UserSession).where(UserSession.session_id.in_(sessions)))
+    rebuild_user_sessions(sessions)
+    rebuild_daily_summaries()
+
+def send(client, case):
+    if case.admin:
+        with client.session_transaction() as client_session:
+            client_session['admin_logged_in'] = True
+    if case.method == 'GET':
+        response = client.get(case.path, query_string=case.params)
+    elif isinstance(case.body, list):
+        response = client.post(case.path, json=case.body)
+    else:
+        response = client.post(case.path, data=case.body)
+    body = response.get_data()  # Streamed exports are produced while this reads them
+    if response.status_code != case.status:
+        raise click.ClickException(f'{case.name}: expected {case.status}, got {response.status_code}: {body[:500]!r}')
+    return len(body)
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return {
+        'min': round(float(samples.min()), 3),
+        'p50': round(float(np.percentile(samples, 50)), 3),
+        'p90': round(float(np.percentile(samples, 90)), 3),
+        'p95': round(float(np.percentile(samples, 95)), 3),
+        'p99': round(float(np.percentile(samples, 99)), 3),
+        'max': round(float(samples.max()), 3),
+        'mean': round(float(samples.mean()), 3),
+    }
+
+def measure(client, case, counter, repeat, warm):
+    latencies, queries = [], []
+    for attempt in range(repeat + 1):
+        if not warm:
+            reset_caches()
+        counter.count = 0
+        started = perf_counter()
+        size = send(client, case)
+        elapsed = perf_counter() - started
+        if attempt:  # The first request warms up templates and per-process state
+            latencies.append(elapsed)
+            queries.append(counter.count)
+
+    if not warm:
+        reset_caches()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    send(client, case)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return {
+        'method': case.method,
+        'path': case.path,
+        'params': case.params,
+        'status': case.status,
+        'samples': repeat,
+        'latency_ms': percentiles(latencies),
+        'queries': {'min': min(queries), 'median': int(np.median(queries)), 'max': max(queries)},
+        'peak_memory_kb': round(peak / 1024, 1),
+        'response_kb': round(size / 1024, 1),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=app.root_path, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+@click.group()
+def cli():
+    """Synthetic bakery data and route benchmarks"""
+
+@cli.command()
+@click.option('--rows', default='100k', callback=parse_scale, show_default=True,
+              help='Approximate total rows, e.g. 10k, 1M, 10M.')
+@click.option('--seed', type=int, default=42, show_default=True)
+@click.option('--days', type=click.IntRange(28, None), default=730, show_default=True, help='Days of history ending today.')
+@click.option('--reset', is_flag=True, help='Drop and recreate every table first.')
+def generate(rows, seed, days, reset):
+    """Fill the benchmark database with synthetic records"""
+    with app.app_context():
+        if reset:
+            db.drop_all()
+            report_cache.clear()
+        init_database()
+        if not reset and any(row_counts().values()):
+            raise click.ClickException('The benchmark database already has data; pass --reset to replace it.')
+        started = perf_counter()
+        SyntheticData(rows, seed, days).generate(click.echo)
+        counts = row_counts()
+        click.echo(f'{sum(counts.values())} rows in {perf_counter() - started:.1f}s: '
+                   + ', '.join(f'{table} {count}' for table, count in counts.items()))
+
+@cli.command()
+@click.option('--output', type=click.Path(dir_okay=False, writable=True), default='benchmark.json', show_default=True)
+@click.option('--repeat', type=click.IntRange(1, None), default=10, show_default=True, help='Measured requests per case.')
+@click.option('--only', 'patterns', multiple=True, help='Run cases matching this pattern, e.g. "reports*". Repeatable.')
+@click.option('--warm', is_flag=True, help='Keep report caches and finished exports between requests.')
+def run(output, repeat, patterns, warm):
+    """Time every case and write latency percentiles, query counts and peak memory to a JSON baseline"""
+    app.config.update(TESTING=True, EXPORT_ASYNC=False, EXPORT_FOLDER=tempfile.mkdtemp(prefix='benchmark-exports-'))
+    with app.app_context():
+        init_database()
+        if User.query.filter_by(email=BENCHMARK_EMAIL).first() is None:
+            raise click.ClickException('No benchmark data found; run "python benchmark.py generate" first.')
+        last_day = db.session.scalar(db.select(db.func.max(DailySale.sale_date))) or date.today()
+        rows = row_counts()
+        dialect = db.engine.dialect.name
+        before = last_ids()
+        alerts = coalescible_alerts()
+    cases = [case for case in benchmark_cases(last_day)
+             if not patterns or any(fnmatch.fnmatch(case.name, pattern) for pattern in patterns)]
+
+    client = app.test_client()
+    client.post('/login', data={'email': BENCHMARK_EMAIL, 'password': BENCHMARK_PASSWORD})
+    results = {}
+    with app.app_context():
+        counter = QueryCounter()
+        db.event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            for case in cases:
+                results[case.name] = measure(client, case, counter, repeat, warm)
+                latency = results[case.name]['latency_ms']
+                click.echo(f"{case.name:<22} p50 {latency['p50']:>9.1f} ms  p95 {latency['p95']:>9.1f} ms  "
+                           f"{results[case.name]['queries']['median']:>4} queries  "
+                           f"{results[case.name]['peak_memory_kb']:>9.0f} KB")
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', counter)
+            activity_logger.flush()
+            reset_caches()
+            remove_added_rows(before, alerts)
+
+    baseline = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': dialect,
+        'rows': rows,
+        'repeat': repeat,
+        'warm': warm,
+        'peak_rss_kb': peak_rss_kb(),
+        'cases': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(baseline, f, indent=2)
+    click.echo(f'Wrote {len(results)} cases to {output}')
+
+@cli.command()
+@click.argument('before', type=click.File())
+@click.argument('after', type=click.File())
+@click.option('--threshold', type=float, default=0.2, show_default=True,
+              help='Relative p50/p95 latency or peak memory growth reported as a regression.')
+@click.option('--min-change-ms', type=float, default=5.0, show_default=True,
+              help='Smallest latency increase reported as a regression, however large relative to the old time.')
+def compare(before, after, threshold, min_change_ms):
+    """Compare two baselines; exits with status 1 when a case regressed"""
+    before, after = json.load(before), json.load(after)
+    if before['rows'] != after['rows'] or before['database'] != after['database']:
+        click.echo('Warning: the baselines were taken on different data; differences may not come from the code.')
+
+    def change(old, new):
+        return (new - old) / old if old else 0.0
+
+    def cell(old, new):
+        return f'{old:.1f} → {new:.1f} ({change(old, new):+.0%})'
+
+    def slower(old, new, key, spread_from):
+        """Whether a percentile grew past the threshold and past the noise: the floor, or either run's own spread"""
+        noise = max(min_change_ms, old[key] - old[spread_from], new[key] - new[spread_from])
+        return change(old[key], new[key]) > threshold and new[key] - old[key] > noise
+
+    regressions = 0
+    click.echo(f"{'case':<22} {'p50 ms':<26} {'p95 ms':<26} {'queries':<12} memory KB")
+    for name, new in after['cases'].items():
+        old = before['cases'].get(name)
+        if old is None:
+            click.echo(f'{name:<22} (new case)')
+            continue
+        memory = change(old['peak_memory_kb'], new['peak_memory_kb'])
+        regressed = (slower(old['latency_ms'], new['latency_ms'], 'p50', 'min')
+                     or slower(old['latency_ms'], new['latency_ms'], 'p95', 'p50')
+                     or memory > threshold or new['queries']['median'] > old['queries']['median'])
+        regressions += regressed
+        click.echo(f"{name:<22} {cell(old['latency_ms']['p50'], new['latency_ms']['p50']):<26} "
+                   f"{cell(old['latency_ms']['p95'], new['latency_ms']['p95']):<26} "
+                   f"{old['queries']['median']} → {new['queries']['median']:<7} "
+                   f"{cell(old['peak_memory_kb'], new['peak_memory_kb'])}" + ('  REGRESSED' if regressed else ''))
+    for name in sorted(before['cases'].keys() - after['cases'].keys()):
+        click.echo(f'{name:<22} (missing)')
+    if regressions:
+        click.echo(f'{regressions} case(s) regressed')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
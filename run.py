@@ -6,14 +6,17 @@ Startup script
 
 import os
 import sys
-from app import app
+from app import app, init_database
 
 if __name__ == '__main__':
     print("🍞 Starting Speantag Bakery Expense Tracking System...")
     print("📍 Access the application at: http://localhost:5000")
     print("🔄 Press Ctrl+C to stop the server")
     print()
-    
+
+    with app.app_context():
+        init_database()
+
     try:
         app.run(debug=True, host='0.0.0.0', port=5000)
     except KeyboardInterrupt:
@@ -0,0 +1,38 @@
+// Save Activities functionality
+function openSaveActivitiesModal() {
+    document.getElementById('saveActivitiesModal').style.display = 'block';
+}
+
+function closeSaveActivitiesModal() {
+    document.getElementById('saveActivitiesModal').style.display = 'none';
+}
+
+// Close modal when clicking outside
+window.onclick = function(event) {
+    const modal = document.getElementById('saveActivitiesModal');
+    if (event.target == modal) {
+        modal.style.display = 'none';
+    }
+}
+
+// Set up the form action based on current page
+document.addEventListener('DOMContentLoaded', function() {
+    const currentPath = window.location.pathname;
+    let pageName = 'dashboard'; // default
+
+    // Extract page name from URL
+    if (currentPath.includes('/daily-sales')) {
+        pageName = 'daily-sales';
+    } else if (currentPath.includes('/market-purchase')) {
+        pageName = 'market-purchase';
+    } else if (currentPath.includes('/inventory-usage')) {
+        pageName = 'inventory-usage';
+    } else if (currentPath.includes('/reports')) {
+        pageName = 'reports';
+    } else if (currentPath.includes('/admin-dashboard')) {
+        pageName = 'admin-dashboard';
+    }
+
+    const form = document.getElementById('saveActivitiesForm');
+    form.action = `/save-page-activities/${pageName}`;
+});